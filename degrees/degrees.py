@@ -1,7 +1,29 @@
+import argparse
 import csv
+import heapq
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import socketserver
+import struct
 import sys
+import time
+from array import array
+from collections import deque
+from functools import lru_cache
+from operator import itemgetter
+from stat import S_ISSOCK
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
-from util import Node, StackFrontier, QueueFrontier
+from util import Node, StackFrontier
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,55 +34,762 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# Compact integer-indexed store, used instead of the dicts above when loaded
+graph = None
+
+# Dense (person_ids, index) pair for the dictionaries, built on first use
+dict_index = None
+
+# Maximum number of people whose neighbor sets are kept by `neighbors_for_person`
+NEIGHBOR_CACHE_SIZE = 65536
+
+# Landmark distance oracle, set by `build_landmarks` or `load_landmarks`
+oracle = None
+
+# Source file stats and options of the loaded data, set by the loaders
+# and stored with landmarks so stale landmark files can be detected
+data_sources = None
+LANDMARK_MAGIC = b"DEGLAND1"
+
+# Binary snapshot of a compact store, written next to the CSV files
+SNAPSHOT_FILE = "degrees.snapshot"
+SNAPSHOT_MAGIC = b"DEGSNAP1"
+SOURCE_FILES = ("people.csv", "movies.csv", "stars.csv")
+ARRAY_SECTIONS = ("person_offsets", "person_movies", "movie_offsets", "movie_people")
+STRING_SECTIONS = (
+    "person_ids", "person_names", "person_births",
+    "movie_ids", "movie_titles", "movie_years"
+)
+
+
+class HashedQueueFrontier():
+    """
+    Queue frontier with the same interface as `util.QueueFrontier`,
+    backed by a deque and a set of queued states so that `add`,
+    `remove` and `contains_state` all run in constant time.
+    """
+
+    def __init__(self):
+        self.frontier = deque()
+        self.states = set()
+
+    def add(self, node):
+        self.frontier.append(node)
+        self.states.add(node.state)
+
+    def contains_state(self, state):
+        return state in self.states
+
+    def empty(self):
+        return len(self.frontier) == 0
 
-def load_data(directory):
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        node = self.frontier.popleft()
+        self.states.discard(node.state)
+        return node
+
+
+def load_data(directory, report=False, skip_unstarred=False):
     """
     Load data from CSV files into memory.
+
+    Rows are streamed as tuples rather than dictionaries. If `report`
+    is true, per-file row counts, timings and peak memory are printed
+    to stderr. If `skip_unstarred` is true, people with no rows in
+    `stars.csv` are not loaded. Returns the per-file statistics.
     """
+    global graph, dict_index, oracle, data_sources
+    graph = None
+    dict_index = None
+    oracle = None
+    data_sources = _data_sources(directory, skip_unstarred)
+    clear_neighbor_cache()
+    stats = []
+
+    starred = None
+    if skip_unstarred:
+        starred = {
+            person_id for person_id, _ in
+            _read_rows(f"{directory}/stars.csv", ("person_id", "movie_id"), stats)
+        }
+
     # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
+    for person_id, name, birth in _read_rows(
+            f"{directory}/people.csv", ("id", "name", "birth"), stats):
+        if starred is not None and person_id not in starred:
+            continue
+        people[person_id] = {
+            "name": name,
+            "birth": birth,
+            "movies": set()
+        }
+        if name.lower() not in names:
+            names[name.lower()] = {person_id}
+        else:
+            names[name.lower()].add(person_id)
 
     # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
+    for movie_id, title, year in _read_rows(
+            f"{directory}/movies.csv", ("id", "title", "year"), stats):
+        movies[movie_id] = {
+            "title": title,
+            "year": year,
+            "stars": set()
+        }
 
     # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    for person_id, movie_id in _read_rows(
+            f"{directory}/stars.csv", ("person_id", "movie_id"), stats):
+        try:
+            people[person_id]["movies"].add(movie_id)
+            movies[movie_id]["stars"].add(person_id)
+        except KeyError:
+            pass
+
+    if report:
+        _report_load(stats)
+    return stats
+
+
+def _read_rows(path, columns, stats):
+    """
+    Yields a tuple of the named `columns` for each row of a CSV file,
+    then appends the file's row count, timing and peak memory to `stats`.
+    """
+    start = time.perf_counter()
+    rows = 0
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        getter = itemgetter(*(header.index(column) for column in columns))
         for row in reader:
-            try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+            rows += 1
+            yield getter(row)
+    seconds = time.perf_counter() - start
+    stats.append({
+        "file": os.path.basename(path),
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else None,
+        "peak_memory": _peak_memory()
+    })
+
+
+def _peak_memory():
+    """
+    Returns the peak resident memory of this process in bytes,
+    or None where the platform does not report it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _report_load(stats):
+    """
+    Prints the statistics collected while loading the CSV files.
+    """
+    for stat in stats:
+        line = f"{stat['file']}: {stat['rows']} rows in {stat['seconds']:.2f}s"
+        if stat["rows_per_second"] is not None:
+            line += f" ({stat['rows_per_second']:,.0f} rows/s)"
+        if stat["peak_memory"] is not None:
+            line += f", peak memory {stat['peak_memory'] / 2 ** 20:.1f} MiB"
+        print(line, file=sys.stderr)
+
+
+class CompactGraph():
+    """
+    Bipartite person/movie star graph with string IDs interned to
+    dense ints and adjacency stored as CSR arrays: the movies of
+    person `i` are `person_movies[person_offsets[i]:person_offsets[i + 1]]`,
+    and likewise for the stars of each movie.
+    """
+
+    def __init__(self, person_ids, person_names, person_births,
+                 movie_ids, movie_titles, movie_years,
+                 person_offsets, person_movies, movie_offsets, movie_people):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.person_births = person_births
+        self.movie_ids = movie_ids
+        self.movie_titles = movie_titles
+        self.movie_years = movie_years
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_people = movie_people
+
+        self.person_index = {
+            person_id: i for i, person_id in enumerate(person_ids)
+        }
+        self.movie_index = {
+            movie_id: i for i, movie_id in enumerate(movie_ids)
+        }
+        self.names = {}
+        for i, name in enumerate(person_names):
+            key = name.lower()
+            self.names[key] = self.names.get(key, ()) + (i,)
+
+    def neighbors(self, person):
+        """
+        Returns (movie, person) index pairs for people who starred
+        with the person at index `person`.
+        """
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_people = self.movie_people
+        neighbors = []
+        for k in range(self.person_offsets[person],
+                       self.person_offsets[person + 1]):
+            movie = person_movies[k]
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                if movie_people[j] != person:
+                    neighbors.append((movie, movie_people[j]))
+        return neighbors
+
+    def shortest_path(self, source, target):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs
+        that connect the source to the target, searching in index space.
+
+        If no possible path, returns None.
+        """
+        path = _bidirectional_search(
+            self.person_index[source], self.person_index[target],
+            self.neighbors
+        )
+        if path is None:
+            return None
+        return [(self.movie_ids[movie], self.person_ids[person])
+                for movie, person in path]
+
+
+def _csr(keys, values, size):
+    """
+    Groups `values` by `keys` (ints below `size`) into an
+    (offsets, edges) pair of arrays with a counting sort.
+    """
+    offsets = array("i", [0]) * (size + 1)
+    for key in keys:
+        offsets[key + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+
+    edges = array("i", [0]) * len(keys)
+    cursor = array("i", offsets)
+    for key, value in zip(keys, values):
+        edges[cursor[key]] = value
+        cursor[key] += 1
+    return offsets, edges
+
+
+def load_compact_data(directory, report=False, skip_unstarred=False):
+    """
+    Load data from CSV files into a `CompactGraph` and use it
+    in place of the `names`, `people` and `movies` dictionaries.
+    Takes the same options and returns the same statistics as `load_data`.
+    """
+    global graph, dict_index, oracle, data_sources
+    sources = _data_sources(directory, skip_unstarred)
+    stats = []
+
+    starred = None
+    if skip_unstarred:
+        starred = {
+            person_id for person_id, _ in
+            _read_rows(f"{directory}/stars.csv", ("person_id", "movie_id"), stats)
+        }
+
+    person_ids, person_names, person_births = [], [], []
+    for person_id, name, birth in _read_rows(
+            f"{directory}/people.csv", ("id", "name", "birth"), stats):
+        if starred is not None and person_id not in starred:
+            continue
+        person_ids.append(person_id)
+        person_names.append(name)
+        person_births.append(birth)
+
+    movie_ids, movie_titles, movie_years = [], [], []
+    for movie_id, title, year in _read_rows(
+            f"{directory}/movies.csv", ("id", "title", "year"), stats):
+        movie_ids.append(movie_id)
+        movie_titles.append(title)
+        movie_years.append(year)
+
+    person_lookup = {person_id: i for i, person_id in enumerate(person_ids)}
+    movie_lookup = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+    star_people = array("i")
+    star_movies = array("i")
+    for person_id, movie_id in _read_rows(
+            f"{directory}/stars.csv", ("person_id", "movie_id"), stats):
+        person = person_lookup.get(person_id)
+        movie = movie_lookup.get(movie_id)
+        if person is None or movie is None:
+            continue
+        star_people.append(person)
+        star_movies.append(movie)
+
+    person_offsets, person_movies = _csr(
+        star_people, star_movies, len(person_ids)
+    )
+    movie_offsets, movie_people = _csr(
+        star_movies, star_people, len(movie_ids)
+    )
+    dict_index = None
+    oracle = None
+    data_sources = sources
+    clear_neighbor_cache()
+    names.clear()
+    people.clear()
+    movies.clear()
+    graph = CompactGraph(
+        person_ids, person_names, person_births,
+        movie_ids, movie_titles, movie_years,
+        person_offsets, person_movies, movie_offsets, movie_people
+    )
+
+    if report:
+        _report_load(stats)
+    return stats
+
+
+def _source_stats(directory):
+    """
+    Returns the mtime and size of each source CSV file,
+    used to tell whether a snapshot is still current.
+    """
+    stats = {}
+    for filename in SOURCE_FILES:
+        info = os.stat(os.path.join(directory, filename))
+        stats[filename] = [info.st_mtime_ns, info.st_size]
+    return stats
+
+
+def _data_sources(directory, skip_unstarred):
+    """
+    Returns the source file stats and load options that identify
+    the data loaded from `directory`.
+    """
+    return {"files": _source_stats(directory), "skip_unstarred": skip_unstarred}
+
+
+def write_snapshot(directory, path=None, report=False, skip_unstarred=False):
+    """
+    Load the CSV files in `directory` into a compact store and write
+    it to a binary snapshot file that `load_snapshot` can memory-map.
+    `report` and `skip_unstarred` are passed to `load_compact_data`.
+    """
+    path = path or os.path.join(directory, SNAPSHOT_FILE)
+    sources = _source_stats(directory)
+    load_compact_data(directory, report, skip_unstarred)
+
+    # Lay out every section at an 8-byte aligned offset after the header
+    blobs = {}
+    for name in ARRAY_SECTIONS:
+        blobs[name] = getattr(graph, name).tobytes()
+    for name in STRING_SECTIONS:
+        blobs[name] = "\0".join(getattr(graph, name)).encode("utf-8")
+    sections = {}
+    offset = 0
+    for name, blob in blobs.items():
+        sections[name] = [offset, len(blob)]
+        offset += (len(blob) + 7) // 8 * 8
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "sources": sources,
+        "skip_unstarred": skip_unstarred,
+        "people": len(graph.person_ids),
+        "movies": len(graph.movie_ids),
+        "sections": sections
+    }).encode("utf-8")
+    header += b" " * (-(len(SNAPSHOT_MAGIC) + 8 + len(header)) % 8)
+
+    # Write to a temporary file first so readers never see a partial snapshot
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for blob in blobs.values():
+            f.write(blob)
+            f.write(b"\0" * (-len(blob) % 8))
+    os.replace(tmp, path)
+    return path
+
+
+def _read_snapshot_header(path):
+    """
+    Returns the decoded header of a snapshot file and the offset
+    at which its sections begin, or None if the file is not a snapshot.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            return None
+        size, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(size))
+    return header, len(SNAPSHOT_MAGIC) + 8 + size
+
+
+def load_snapshot(directory, path=None, report=False, skip_unstarred=False):
+    """
+    Memory-map the binary snapshot for `directory` into a compact store,
+    compiling it first if it is missing, was written with a different
+    `skip_unstarred`, or any source CSV has changed size or modification
+    time since it was written. If `report` is true, the time taken to
+    compile and map the snapshot is printed to stderr.
+    """
+    global graph, dict_index, oracle, data_sources
+    path = path or os.path.join(directory, SNAPSHOT_FILE)
+    start_time = time.perf_counter()
+
+    header = None
+    if os.path.exists(path):
+        header = _read_snapshot_header(path)
+    if (header is None
+            or header[0]["sources"] != _source_stats(directory)
+            or header[0].get("skip_unstarred") != skip_unstarred
+            or header[0]["byteorder"] != sys.byteorder):
+        write_snapshot(directory, path, report, skip_unstarred)
+        header = _read_snapshot_header(path)
+    header, start = header
+
+    with open(path, "rb") as f:
+        snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(snapshot)
+
+    sections = {}
+    for name in ARRAY_SECTIONS:
+        offset, length = header["sections"][name]
+        sections[name] = view[start + offset:start + offset + length].cast("i")
+    counts = {"person": header["people"], "movie": header["movies"]}
+    for name in STRING_SECTIONS:
+        offset, length = header["sections"][name]
+        if counts[name.split("_")[0]] == 0:
+            sections[name] = []
+            continue
+        blob = view[start + offset:start + offset + length]
+        sections[name] = str(blob, "utf-8").split("\0")
+
+    dict_index = None
+    oracle = None
+    data_sources = {
+        "files": header["sources"],
+        "skip_unstarred": header["skip_unstarred"]
+    }
+    clear_neighbor_cache()
+    names.clear()
+    people.clear()
+    movies.clear()
+    graph = CompactGraph(**sections)
+    graph.snapshot = snapshot
+
+    if report:
+        seconds = time.perf_counter() - start_time
+        rows = header["people"] + header["movies"] + len(graph.person_movies)
+        _report_load([{
+            "file": os.path.basename(path),
+            "rows": rows,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds > 0 else None,
+            "peak_memory": _peak_memory()
+        }])
+
+
+def resolve_person(query):
+    """
+    Returns (person_id, error) for a person_id or name without prompting.
+    Ambiguous names are reported as an error listing the candidate ids.
+    """
+    if graph is not None:
+        if query in graph.person_index:
+            return query, None
+    elif query in people:
+        return query, None
+
+    person_ids = person_ids_for_name(query)
+    if len(person_ids) == 0:
+        return None, f"Person not found: {query}"
+    elif len(person_ids) > 1:
+        return None, f"Ambiguous name: {query} ({', '.join(sorted(person_ids))})"
+    return person_ids[0], None
+
+
+def answer_query(source, target):
+    """
+    Resolves a pair of names or person_ids and returns the shortest
+    path between them as a JSON-serializable dictionary.
+    """
+    result = {"source": source, "target": target}
+    source_id, error = resolve_person(source)
+    if error is None:
+        target_id, error = resolve_person(target)
+    if error is not None:
+        result["error"] = error
+        return result
+
+    path = bidirectional_shortest_path(source_id, target_id)
+    result["source_id"] = source_id
+    result["target_id"] = target_id
+    if oracle is not None:
+        result["bounds"] = [
+            None if bound == math.inf else bound
+            for bound in estimate_degrees(source_id, target_id)
+        ]
+    if path is None:
+        result["degrees"] = None
+        result["path"] = None
+    else:
+        result["degrees"] = len(path)
+        result["path"] = [
+            {
+                "movie_id": movie_id,
+                "title": movie_info(movie_id)["title"],
+                "person_id": person_id,
+                "name": person_info(person_id)["name"]
+            }
+            for movie_id, person_id in path
+        ]
+    return result
+
+
+def _parse_pair(line):
+    """
+    Returns the (source, target) pair in a CSV line, or None if the
+    line does not hold exactly two fields.
+    """
+    row = next(csv.reader([line]), [])
+    if len(row) != 2:
+        return None
+    return row[0].strip(), row[1].strip()
+
+
+def _answer_line(line):
+    """
+    Answers the query on one batch line.
+    """
+    pair = _parse_pair(line)
+    if pair is None:
+        return {"line": line.rstrip("\n"), "error": "Expected source,target"}
+    return answer_query(*pair)
+
+
+def _fork_pool(workers):
+    """
+    Returns a process pool whose workers are forked from this process,
+    so they share the loaded graph copy-on-write instead of receiving
+    a pickled copy, or None if forking is unavailable on this platform.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork").Pool(workers)
+
+
+def _path_for_pair(pair):
+    return bidirectional_shortest_path(*pair)
+
+
+def parallel_shortest_paths(pairs, workers=None, chunksize=16):
+    """
+    Returns the shortest path for each (source, target) pair of
+    person_ids, in order, computing them across a pool of `workers`
+    processes (default: one per CPU) that share the loaded graph.
+    """
+    pool = _fork_pool(workers)
+    if pool is None:
+        return [_path_for_pair(pair) for pair in pairs]
+    with pool:
+        return pool.map(_path_for_pair, pairs, chunksize)
+
+
+def run_batch(lines, out, workers=1):
+    """
+    Answers one query per CSV line of `source,target` names or ids,
+    writing each result to `out` as a JSON line as soon as it is ready.
+    With more than one worker, queries are answered in a process pool
+    and results are still written in input order.
+    """
+    lines = (line for line in lines if line.strip())
+    pool = _fork_pool(workers) if workers > 1 else None
+    if pool is None:
+        results = map(_answer_line, lines)
+    else:
+        results = pool.imap(_answer_line, lines, 16)
+    try:
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answers `GET /?source=...&target=...` with a JSON result.
+    """
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        if "source" not in params or "target" not in params:
+            status, result = 400, {"error": "Expected source and target"}
+        else:
+            status = 200
+            result = answer_query(params["source"][0], params["target"][0])
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StreamQueryHandler(socketserver.StreamRequestHandler):
+    """
+    Answers each `source,target` line on a socket connection
+    with a JSON line, like `run_batch`.
+    """
+
+    def handle(self):
+        lines = (line.decode("utf-8") for line in self.rfile)
+        out = _SocketWriter(self.wfile)
+        run_batch(lines, out)
+
+
+class _SocketWriter():
+    """
+    Text adapter over a socket's binary write file.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode("utf-8"))
+
+    def flush(self):
+        self.wfile.flush()
+
+
+def serve_http(address):
+    """
+    Serves queries over HTTP at `address`, given as "[host:]port",
+    one thread per request, until interrupted.
+    """
+    host, _, port = address.rpartition(":")
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), QueryHandler)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_port}",
+          file=sys.stderr)
+    with server:
+        server.serve_forever()
+
+
+def serve_unix(path):
+    """
+    Serves line-based queries on a Unix socket at `path`,
+    one thread per connection, until interrupted. A stale socket left
+    at `path` is replaced, but anything else there raises FileExistsError.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        mode = None
+    if mode is not None:
+        if not S_ISSOCK(mode):
+            raise FileExistsError(f"{path} exists and is not a socket")
+        os.remove(path)
+    server = socketserver.ThreadingUnixStreamServer(path, StreamQueryHandler)
+    print(f"Serving on unix:{path}", file=sys.stderr)
+    with server:
+        server.serve_forever()
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find degrees of separation between two actors."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="load into the integer-indexed CSR store"
+    )
+    parser.add_argument(
+        "--snapshot", action="store_true",
+        help="memory-map a cached binary snapshot, compiling it if stale"
+    )
+    parser.add_argument(
+        "--profile-load", action="store_true",
+        help="report rows per second, timings and peak memory while loading"
+    )
+    parser.add_argument(
+        "--skip-unstarred", action="store_true",
+        help="do not load people who have no rows in stars.csv"
+    )
+    parser.add_argument(
+        "--landmarks", metavar="FILE",
+        help="load landmark distances from FILE (building it if missing or "
+             "stale), report distance bounds with --batch and server results "
+             "and answer pairs they show are unconnected without searching"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of processes answering --batch queries"
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--batch", metavar="FILE",
+        help="answer source,target lines from FILE (- for stdin) as JSON lines"
+    )
+    mode.add_argument(
+        "--serve", metavar="[HOST:]PORT",
+        help="keep the data loaded and answer queries over HTTP"
+    )
+    mode.add_argument(
+        "--unix", metavar="PATH",
+        help="keep the data loaded and answer queries on a Unix socket"
+    )
+    args = parser.parse_args()
+    directory = args.directory
+
+    # Keep stdout clean for JSON output in non-interactive modes
+    log = sys.stdout
+    if args.batch or args.serve or args.unix:
+        log = sys.stderr
 
     # Load data from files into memory
-    print("Loading data...")
-    load_data(directory)
-    print("Data loaded.")
+    print("Loading data...", file=log)
+    if args.snapshot:
+        load_snapshot(directory, None, args.profile_load, args.skip_unstarred)
+    elif args.compact:
+        load_compact_data(directory, args.profile_load, args.skip_unstarred)
+    else:
+        load_data(directory, args.profile_load, args.skip_unstarred)
+    print("Data loaded.", file=log)
+
+    if args.landmarks and (not os.path.exists(args.landmarks)
+                           or load_landmarks(args.landmarks) is None):
+        print("Building landmarks...", file=log)
+        build_landmarks().save(args.landmarks)
+
+    if args.batch == "-":
+        run_batch(sys.stdin, sys.stdout, args.workers)
+        return
+    elif args.batch:
+        with open(args.batch, encoding="utf-8") as f:
+            run_batch(f, sys.stdout, args.workers)
+        return
+    elif args.serve:
+        serve_http(args.serve)
+        return
+    elif args.unix:
+        try:
+            serve_unix(args.unix)
+        except FileExistsError as e:
+            sys.exit(str(e))
+        return
 
     source = person_id_for_name(input("Name: "))
     if source is None:
@@ -69,7 +798,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = bidirectional_shortest_path(source, target)
     if path is None:
         print("None,his pp too small")
     else:
@@ -77,9 +806,9 @@ def main():
         print(f"{degrees} degrees of separation.")
         path = [(None, source)] + path
         for i in range(degrees):
-            person1 = people[path[i][1]]["name"]
-            person2 = people[path[i + 1][1]]["name"]
-            movie = movies[path[i + 1][0]]["title"]
+            person1 = person_info(path[i][1])["name"]
+            person2 = person_info(path[i + 1][1])["name"]
+            movie = movie_info(path[i + 1][0])["title"]
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
@@ -89,10 +818,15 @@ def shortest_path(source, target):
     that connect the source to the target.
 
     If no possible path, returns None.
-    """    
+    """
+    if _unconnected(source, target):
+        return None
+    if graph is not None:
+        return graph.shortest_path(source, target)
+
     """ initialize frontier to start """
     start = Node(state=source, parent=None, action=None)
-    frontier = QueueFrontier()
+    frontier = HashedQueueFrontier()
     frontier.add(start)
     
     # empty explored set
@@ -142,18 +876,120 @@ def shortest_path(source, target):
                 frontier.add(child)
             
 
+def bidirectional_shortest_path(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, like `shortest_path`,
+    but searches from both ends at once and stops where they meet.
+
+    Each step expands one full level of whichever side has the
+    smaller frontier, so only about half the search depth is
+    explored from either end. With landmarks loaded, pairs they
+    show are not connected are answered without searching.
+
+    If no possible path, returns None.
+    """
+    if _unconnected(source, target):
+        return None
+    if graph is not None:
+        return graph.shortest_path(source, target)
+    return _bidirectional_search(source, target, neighbors_for_person)
+
+
+def _unconnected(source, target):
+    """
+    Returns whether loaded landmarks show that no path connects
+    two people, so that searching for one can be skipped.
+    """
+    return (oracle is not None and source != target
+            and estimate_degrees(source, target)[0] == math.inf)
+
+
+def _bidirectional_search(source, target, neighbors):
+    """
+    Runs the bidirectional BFS over any graph given by a `neighbors`
+    function returning (action, state) pairs, and returns the list
+    of (action, state) pairs from source to target, or None.
+    """
+    if source == target:
+        return []
+
+    # Maps person_id to (parent person_id, movie_id, depth) for each side
+    forward = {source: (None, None, 0)}
+    backward = {target: (None, None, 0)}
+    forward_frontier = [source]
+    backward_frontier = [target]
+
+    while forward_frontier and backward_frontier:
+
+        # Always grow the cheaper side
+        if len(forward_frontier) <= len(backward_frontier):
+            frontier, visited, other = forward_frontier, forward, backward
+        else:
+            frontier, visited, other = backward_frontier, backward, forward
+
+        next_frontier = []
+        best = None
+        for person in frontier:
+            depth = visited[person][2] + 1
+            for movie, neighbor in neighbors(person):
+                if neighbor in visited:
+                    continue
+                visited[neighbor] = (person, movie, depth)
+                next_frontier.append(neighbor)
+
+                # Keep the cheapest meeting point found on this level
+                if neighbor in other:
+                    length = depth + other[neighbor][2]
+                    if best is None or length < best[0]:
+                        best = (length, neighbor)
+
+        if best is not None:
+            return _join_paths(forward, backward, best[1])
+
+        if visited is forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    return None
+
+
+def _join_paths(forward, backward, meeting):
+    """
+    Builds the (movie_id, person_id) path through `meeting` from the
+    parent maps of a bidirectional search.
+    """
+    # Walk back from the meeting point to the source
+    path = []
+    person = meeting
+    while forward[person][0] is not None:
+        parent, movie, _ = forward[person]
+        path.append((movie, person))
+        person = parent
+    path.reverse()
+
+    # Walk forward from the meeting point to the target
+    person = meeting
+    while backward[person][0] is not None:
+        parent, movie, _ = backward[person]
+        path.append((movie, parent))
+        person = parent
+    return path
+
+
 def person_id_for_name(name):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
     """
-    person_ids = list(names.get(name.lower(), set()))
+    person_ids = person_ids_for_name(name)
     if len(person_ids) == 0:
         return None
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
         for person_id in person_ids:
-            person = people[person_id]
+            person = person_info(person_id)
             name = person["name"]
             birth = person["birth"]
             print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
@@ -168,17 +1004,358 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+class DistanceTable():
+    """
+    Distances and BFS parents from one source to every person it reaches,
+    stored in arrays over a dense person index.
+    """
+
+    def __init__(self, source, person_ids, index, distance, parent, movie):
+        self.source = source
+        self.person_ids = person_ids
+        self.index = index
+        self.distances = distance
+        self.parents = parent
+        self.movies = movie
+
+    def distance(self, person_id):
+        """
+        Returns the degrees of separation from the source,
+        or None if the person was not reached.
+        """
+        d = self.distances[self.index[person_id]]
+        return None if d < 0 else d
+
+    def path(self, person_id):
+        """
+        Returns the list of (movie_id, person_id) pairs from the source
+        to a person in O(path length), or None if it was not reached.
+        """
+        i = self.index[person_id]
+        if self.distances[i] < 0:
+            return None
+        path = []
+        while self.parents[i] >= 0:
+            path.append((self.movies[i], self.person_ids[i]))
+            i = self.parents[i]
+        path.reverse()
+        return path
+
+    def within(self, depth):
+        """
+        Returns the person_ids at most `depth` degrees from the source.
+        """
+        return [
+            self.person_ids[i] for i, d in enumerate(self.distances)
+            if 0 <= d <= depth
+        ]
+
+
+def person_index():
+    """
+    Returns a list of all person_ids and a dictionary mapping
+    each of them to its position in that list.
+    """
+    global dict_index
+    if graph is not None:
+        return graph.person_ids, graph.person_index
+    if dict_index is None:
+        person_ids = list(people)
+        dict_index = (person_ids, {p: i for i, p in enumerate(person_ids)})
+    return dict_index
+
+
+def single_source_distances(source, max_depth=None):
+    """
+    Runs one BFS from `source` using `neighbors_for_person` and returns
+    a `DistanceTable` of every person within `max_depth` degrees
+    (or every reachable person if `max_depth` is None).
+    """
+    person_ids, index = person_index()
+    distance = array("i", [-1]) * len(person_ids)
+    parent = array("i", [-1]) * len(person_ids)
+    movie = [None] * len(person_ids)
+
+    distance[index[source]] = 0
+    frontier = [source]
+    depth = 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        next_frontier = []
+        for person in frontier:
+            i = index[person]
+            for movie_id, neighbor in neighbors_for_person(person):
+                j = index[neighbor]
+                if distance[j] >= 0:
+                    continue
+                distance[j] = depth
+                parent[j] = i
+                movie[j] = movie_id
+                next_frontier.append(neighbor)
+        frontier = next_frontier
+
+    return DistanceTable(source, person_ids, index, distance, parent, movie)
+
+
+class LandmarkOracle():
+    """
+    BFS distances from a few landmark people to everyone, used to bound
+    the degrees of separation between any two people by the triangle
+    inequality without searching the graph. `sources` identifies the
+    data the distances were computed from (see `data_sources`).
+    """
+
+    def __init__(self, landmarks, person_ids, index, distances, sources=None):
+        self.landmarks = landmarks
+        self.person_ids = person_ids
+        self.index = index
+        self.distances = distances
+        self.sources = sources
+
+    def profile(self, person_id):
+        """
+        Returns the distance from each landmark to a person (-1 if unreached).
+        """
+        i = self.index[person_id]
+        return [distance[i] for distance in self.distances]
+
+    def bounds(self, source_profile, target_profile):
+        """
+        Returns (lower, upper) bounds on the distance between two people
+        given their landmark profiles, with math.inf where unbounded.
+        """
+        lower, upper = 0, math.inf
+        for a, b in zip(source_profile, target_profile):
+            if a < 0 and b < 0:
+                continue
+            if a < 0 or b < 0:
+                # One is connected to the landmark and the other is not
+                return math.inf, math.inf
+            lower = max(lower, abs(a - b))
+            upper = min(upper, a + b)
+        return lower, upper
+
+    def save(self, path):
+        """
+        Writes the landmarks and their distance arrays to a binary file.
+        """
+        header = json.dumps({
+            "byteorder": sys.byteorder,
+            "people": len(self.person_ids),
+            "sources": self.sources,
+            "landmarks": self.landmarks
+        }).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(LANDMARK_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for distance in self.distances:
+                distance.tofile(f)
+
+
+def build_landmarks(count=16):
+    """
+    Picks `count` landmark people and runs a BFS from each of them.
+    The first landmark is the person in the most movies, and each next
+    one is the reachable person farthest from all landmarks so far.
+    Sets and returns the module's landmark oracle.
+    """
+    global oracle
+    person_ids, index = person_index()
+    if not person_ids:
+        oracle = LandmarkOracle([], person_ids, index, [], data_sources)
+        return oracle
+
+    landmarks = [max(person_ids, key=_movie_count)]
+    distances = []
+    nearest = None
+    while True:
+        table = single_source_distances(landmarks[-1])
+        distances.append(table.distances)
+        if nearest is None:
+            nearest = array("i", table.distances)
+        else:
+            for i, d in enumerate(table.distances):
+                if 0 <= d < nearest[i]:
+                    nearest[i] = d
+        if len(landmarks) == count:
+            break
+        farthest = max(range(len(nearest)), key=nearest.__getitem__)
+        if nearest[farthest] <= 0:
+            break
+        landmarks.append(person_ids[farthest])
+
+    oracle = LandmarkOracle(landmarks, person_ids, index, distances, data_sources)
+    return oracle
+
+
+def load_landmarks(path):
+    """
+    Reads landmarks written by `LandmarkOracle.save` for the loaded
+    data and sets them as the module's landmark oracle. Returns None,
+    leaving no oracle set, if the file was built from different source
+    files or load options, or for a different number of people.
+    """
+    global oracle
+    person_ids, index = person_index()
+    with open(path, "rb") as f:
+        if f.read(len(LANDMARK_MAGIC)) != LANDMARK_MAGIC:
+            raise ValueError(f"{path} is not a landmark file")
+        size, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(size))
+        if (header["people"] != len(person_ids)
+                or header.get("sources") != data_sources
+                or header["byteorder"] != sys.byteorder):
+            oracle = None
+            return None
+        distances = []
+        for _ in header["landmarks"]:
+            distance = array("i")
+            distance.fromfile(f, len(person_ids))
+            distances.append(distance)
+    oracle = LandmarkOracle(
+        header["landmarks"], person_ids, index, distances, header["sources"]
+    )
+    return oracle
+
+
+def _movie_count(person_id):
+    if graph is not None:
+        i = graph.person_index[person_id]
+        return graph.person_offsets[i + 1] - graph.person_offsets[i]
+    return len(people[person_id]["movies"])
+
+
+def estimate_degrees(source, target):
+    """
+    Returns (lower, upper) bounds on the degrees of separation between
+    two people from the landmark oracle, with math.inf where unbounded.
+    """
+    if source == target:
+        return 0, 0
+    lower, upper = oracle.bounds(oracle.profile(source), oracle.profile(target))
+    return max(lower, 1), upper
+
+
+def landmark_shortest_path(source, target):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs that
+    connect the source to the target, using an A* search guided by
+    the landmark lower bounds to the target.
+
+    Landmark bounds on a sparse co-star graph are loose, so this
+    usually expands many more people than the breadth-first searches
+    of `shortest_path` and `bidirectional_shortest_path`, which the
+    command line uses.
+
+    If no possible path, returns None.
+    """
+    target_profile = oracle.profile(target)
+    if oracle.bounds(oracle.profile(source), target_profile)[0] == math.inf:
+        return None
+
+    parents = {source: (None, None)}
+    cost = {source: 0}
+    frontier = [(0, 0, source)]
+    counter = 1
+    while frontier:
+        _, _, person = heapq.heappop(frontier)
+        if person == target:
+            path = []
+            while parents[person][0] is not None:
+                parent, movie = parents[person]
+                path.append((movie, person))
+                person = parent
+            path.reverse()
+            return path
+
+        depth = cost[person] + 1
+        for movie, neighbor in neighbors_for_person(person):
+            if neighbor in cost and cost[neighbor] <= depth:
+                continue
+            cost[neighbor] = depth
+            parents[neighbor] = (person, movie)
+            lower = oracle.bounds(oracle.profile(neighbor), target_profile)[0]
+            heapq.heappush(frontier, (depth + lower, counter, neighbor))
+            counter += 1
+    return None
+
+
+def person_ids_for_name(name):
+    """
+    Returns the list of IMDB ids for people with a given name.
+    """
+    if graph is not None:
+        return [graph.person_ids[i] for i in graph.names.get(name.lower(), ())]
+    return list(names.get(name.lower(), set()))
+
+
+def person_info(person_id):
+    """
+    Returns a dictionary with the name and birth of a person.
+    """
+    if graph is not None:
+        i = graph.person_index[person_id]
+        return {"name": graph.person_names[i], "birth": graph.person_births[i]}
+    return people[person_id]
+
+
+def movie_info(movie_id):
+    """
+    Returns a dictionary with the title and year of a movie.
+    """
+    if graph is not None:
+        i = graph.movie_index[movie_id]
+        return {"title": graph.movie_titles[i], "year": graph.movie_years[i]}
+    return movies[movie_id]
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
-    who starred with a given person.
+    who starred with a given person, not including the person.
+
+    Results are shared frozensets kept in a bounded LRU cache;
+    see `neighbor_cache_info`.
     """
+    return _cached_neighbors(person_id)
+
+
+def _neighbors_for_person(person_id):
+    if graph is not None:
+        return frozenset(
+            (graph.movie_ids[movie], graph.person_ids[person])
+            for movie, person in graph.neighbors(graph.person_index[person_id])
+        )
     movie_ids = people[person_id]["movies"]
     neighbors = set()
     for movie_id in movie_ids:
-        for person_id in movies[movie_id]["stars"]:
-            neighbors.add((movie_id, person_id))
-    return neighbors
+        for star_id in movies[movie_id]["stars"]:
+            if star_id != person_id:
+                neighbors.add((movie_id, star_id))
+    return frozenset(neighbors)
+
+
+_cached_neighbors = lru_cache(maxsize=NEIGHBOR_CACHE_SIZE)(_neighbors_for_person)
+
+
+def neighbor_cache_info():
+    """
+    Returns the hits, misses, maxsize and currsize of the neighbor cache.
+    """
+    return _cached_neighbors.cache_info()
+
+
+def clear_neighbor_cache(maxsize=None):
+    """
+    Empties the neighbor cache, optionally changing how many
+    people it holds (None keeps the current size).
+    """
+    global _cached_neighbors
+    if maxsize is None:
+        _cached_neighbors.cache_clear()
+    else:
+        _cached_neighbors = lru_cache(maxsize=maxsize)(_neighbors_for_person)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,11 @@
+import argparse
 import csv
 import itertools
+import math
 import sys
 
+import numpy as np
+
 PROBS = {
 
     # Unconditional probabilities for having gene
@@ -36,14 +40,64 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Possible numbers of copies of the gene a person can have
+GENES = (0, 1, 2)
+
+# Gene prior and inheritance tables, compiled from PROBS by `gene_tables`
+compiled_tables = None
+
+# Ways of computing the gene and trait distributions
+METHODS = ("enumerate", "pruned", "elimination", "vectorized", "log")
+
+# Gene assignments evaluated at once by `vectorized_probabilities`
+BATCH_SIZE = 1 << 16
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Infer gene and trait probabilities for a family."
+    )
+    parser.add_argument("data", help="CSV file with name, mother, father, trait")
+    parser.add_argument("--method", choices=METHODS, default="enumerate")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="gene assignments per batch for --method vectorized")
+    args = parser.parse_args()
+    people = load_data(args.data)
+
+    try:
+        if args.method == "elimination":
+            probabilities = eliminate_variables(people)
+        elif args.method == "log":
+            probabilities = eliminate_variables(people, log=True)
+        elif args.method == "pruned":
+            probabilities = pruned_probabilities(people)
+        elif args.method == "vectorized":
+            probabilities = vectorized_probabilities(people, args.batch_size)
+        else:
+            probabilities = enumerate_probabilities(people)
+    except ValueError as e:
+        if args.method == "log":
+            sys.exit(str(e))
+        sys.exit(f"{e}; try --method log")
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
 
+def enumerate_probabilities(people):
+    """
+    Compute each person's gene and trait distributions by summing
+    `joint_probability` over every assignment consistent with the
+    known traits.
+    """
     # Keep track of gene and trait probabilities for each person
     probabilities = {
         person: {
@@ -83,15 +137,7 @@ def main():
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
-
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+    return probabilities
 
 
 def load_data(filename):
@@ -128,106 +174,30 @@ def powerset(s):
     ]
     
        
-def get_parents(people, child, one_gene, two_gene):
-    """
-    Calculates number of genes parents have
-    Returns a dictionary with 'mom' and 'dad' as keys and number of genes as value
-    """    
-    x = dict()
-    if people[child]['mother'] != None:
-        if people[child]['mother'] in one_gene:
-            x['mom'] = (people[child]['mother'], 1)
-        elif people[child]['mother']  in two_gene:
-            x['mom'] = (people[child]['mother'], 2)
-        else:
-            x['mom'] = (people[child]['mother'], 0)   
-    else:
-        x['mom'] = (None, 0)
-    
-    if people[child]['father'] != None:
-        if people[child]['father'] in one_gene:
-            x['dad'] = (people[child]['father'], 1)
-        elif people[child]['father'] in two_gene:
-            x['dad'] = (people[child]['father'], 2)
-        else:
-            x['dad'] = (people[child]['father'], 0)          
-    else:
-        x['dad'] = (None, 0)
-    
-    return x   
-
-
-def no_gene_probablity(person, parent_gene):
-    """
-    calculates probablity that a aperson has 0 copies of genes
-    parent_gene is a tuple containing number of mother and father genes
-    """
-    if parent_gene == (None, None):
-        return PROBS['gene'][0]
-    if parent_gene == (0, 0):
-        return (1 - PROBS['mutation']) * (1 - PROBS['mutation'])
-    if parent_gene == (1, 0) or parent_gene == (0, 1):
-        return 0.5 * (1 - PROBS['mutation'])
-    if parent_gene == (1, 1):
-        return 0.5 * 0.5
-    if parent_gene == (2, 2):
-        return (PROBS['mutation']) * (PROBS['mutation'])
-    if parent_gene == (2, 0) or parent_gene == (0, 2):
-        return 0.01 * 0.99  
-    if parent_gene == (2, 1) or parent_gene == (1, 2):
-        return PROBS['mutation'] * 0.5
-
-
-def one_gene_probablity(person,parent_gene):
-    """
-    calculates probablity that a aperson has 1 copies of genes
-    """
-    if parent_gene == (None,None):
-        return PROBS['gene'][1]
-    if parent_gene == (0, 0):
-        return ((1 - PROBS['mutation']) * (PROBS['mutation']))*2
-    if parent_gene == (1, 0) or parent_gene == (0, 1):
-        return 0.5*PROBS['mutation'] + 0.5 * (1 - PROBS['mutation'])
-    if parent_gene == (1, 1):
-        return 0.5 * 0.5 + 0.5 * 0.5
-    if parent_gene == (2, 2):
-        return ((PROBS['mutation']) * (1 - PROBS['mutation']))*2
-    if parent_gene == (2, 0) or parent_gene == (0, 2):
-        return (1 - PROBS['mutation']) * 0.99 + (PROBS['mutation'] * PROBS['mutation'])   
-    if parent_gene == (2, 1) or parent_gene == (1, 2):
-        return (1 - PROBS['mutation'])*0.5 + PROBS['mutation'] * 0.5
-
-                
-def two_gene_probablity(person, parent_gene):
-    """
-    calculates probablity that a aperson has 2 copies of genes
-    """
-    if parent_gene == (None, None):
-        return PROBS['gene'][2]
-    if parent_gene == (0, 0):
-        return (PROBS['mutation']) * (PROBS['mutation'])
-    if parent_gene == (1, 0) or parent_gene == (0, 1):
-        return  0.5 * (PROBS['mutation'])
-    if parent_gene == (1, 1):
-        return 0.5 * 0.5
-    if parent_gene == (2, 2):
-        return (1 - PROBS['mutation']) * (1 - PROBS['mutation'])
-    if parent_gene == (2, 0) or parent_gene == (0, 2):
-        return (1 - PROBS['mutation']) * PROBS['mutation']  
-    if parent_gene == (2, 1) or parent_gene == (1, 2):
-        return (1 - PROBS['mutation']) * 0.5 
-
-  
-def get_parent_gene(x):
-    if x['mom'][0] != None and x['dad'][0] != None:
-        return (x['mom'][1], x['dad'][1])
-    elif x['mom'][0] == None and x['dad'][0] == None:
-        return (None, None)
-    else:
-        return (x['mom'][1], x['dad'][1])                              
-                
- 
-    
+def gene_tables():
+    """
+    Return the gene prior and the inheritance table compiled from PROBS:
+    `prior[g]` is the probability of g copies for someone with no listed
+    parents, and `inheritance[m][f][g]` the probability of g copies given
+    a mother with m copies and a father with f.
+
+    The tables are rebuilt whenever PROBS["gene"] or PROBS["mutation"]
+    has changed since they were last compiled.
+    """
+    global compiled_tables
+    key = (PROBS["mutation"], tuple(PROBS["gene"][g] for g in GENES))
+    if compiled_tables is None or compiled_tables[0] != key:
+        inheritance = tuple(
+            tuple(
+                tuple(inheritance_probability(child, mother, father)
+                      for child in GENES)
+                for father in GENES
+            )
+            for mother in GENES
+        )
+        compiled_tables = (key, (key[1], inheritance))
+    return compiled_tables[1]
+
 
 def joint_probability(people, one_gene, two_genes, have_trait):
     """
@@ -240,34 +210,24 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
     """
+    prior, inheritance = gene_tables()
+
+    def copies(name):
+        if name in two_genes:
+            return 2
+        if name in one_gene:
+            return 1
+        return 0
+
     result = 1
-    for ele in people.keys():
-        x = get_parents(people, ele, one_gene, two_genes)
-        parent_gene = get_parent_gene(x)
-        if ele in one_gene:
-            a = one_gene_probablity(ele, parent_gene)
-            if ele in have_trait:
-                p = a * PROBS['trait'][1][True]
-            else:
-                p = a * PROBS['trait'][1][False]   
-            result = result * p     
-                
-        elif ele in two_genes:
-            a = two_gene_probablity(ele, parent_gene)
-            if ele in have_trait:
-                q = a * PROBS['trait'][2][True]
-            else:
-                q = a * PROBS['trait'][2][False]    
-            result = result * q  
-            
+    for ele, person in people.items():
+        gene = copies(ele)
+        if person["mother"] is None and person["father"] is None:
+            a = prior[gene]
         else:
-            a = no_gene_probablity(ele, parent_gene) 
-            if ele in have_trait:
-                r = a * PROBS['trait'][0][True]
-            else:
-                r = a * PROBS['trait'][0][False]       
-            result = result * r
-    
+            a = inheritance[copies(person["mother"])][copies(person["father"])][gene]
+        result = result * a * PROBS['trait'][gene][ele in have_trait]
+
     return result
 
 
@@ -296,15 +256,425 @@ def normalize(probabilities):
     """
     Update `probabilities` such that each probability distribution
     is normalized (i.e., sums to 1, with relative proportions the same).
+
+    Raise ValueError if a distribution's total is zero or not finite,
+    which happens when the joint probabilities have underflowed.
     """
     for ele in probabilities:
         gene_sum = probabilities[ele]['gene'][0] + probabilities[ele]['gene'][1] + probabilities[ele]['gene'][2]
         trait_sum = probabilities[ele]['trait'][True] + probabilities[ele]['trait'][False]
+        check_mass(ele, gene_sum)
+        check_mass(ele, trait_sum)
         probabilities[ele]['gene'][0] /= gene_sum
         probabilities[ele]['gene'][1] /= gene_sum
         probabilities[ele]['gene'][2] /= gene_sum
         probabilities[ele]['trait'][True] /= trait_sum
         probabilities[ele]['trait'][False] /= trait_sum
 
+
+def check_mass(name, total, log=False):
+    """
+    Raise ValueError unless `total`, the unnormalized mass of one of
+    `name`'s distributions, is positive and finite. If `log` is true,
+    `total` is a log mass and need only be finite.
+    """
+    degenerate = not math.isfinite(total) if log else not 0 < total < math.inf
+    if degenerate:
+        raise ValueError(
+            f"Probability mass for {name} is numerically degenerate ({total})"
+        )
+
+
+def log_probability(p):
+    """
+    Return the natural log of probability `p`, with log(0) = -inf.
+    """
+    return math.log(p) if p > 0 else -math.inf
+
+
+def log_sum_exp(values):
+    """
+    Return log(sum(exp(v) for v in values)) without underflow, by
+    factoring out the largest value.
+    """
+    largest = max(values)
+    if largest == -math.inf:
+        return largest
+    return largest + math.log(sum(math.exp(v - largest) for v in values))
+
+
+def inheritance_probability(child, mother, father):
+    """
+    Return the probability that a child has `child` copies of the gene
+    given the number of copies of each parent (a missing parent counts
+    as having none).
+    """
+    passes = {
+        0: PROBS["mutation"],
+        1: 0.5,
+        2: 1 - PROBS["mutation"]
+    }
+    from_mother = passes[mother]
+    from_father = passes[father]
+    if child == 0:
+        return (1 - from_mother) * (1 - from_father)
+    if child == 1:
+        return from_mother * (1 - from_father) + (1 - from_mother) * from_father
+    return from_mother * from_father
+
+
+def evidence_probability(person, gene):
+    """
+    Return the probability of a person's known trait given their
+    number of copies of the gene, or 1 if the trait is unknown.
+    """
+    if person["trait"] is None:
+        return 1
+    return PROBS["trait"][gene][person["trait"]]
+
+
+def gene_probability(people, name, gene, genes):
+    """
+    Return the probability that person `name` has `gene` copies of the
+    gene, given the gene counts of their parents in `genes`.
+    """
+    prior, inheritance = gene_tables()
+    person = people[name]
+    if person["mother"] is None and person["father"] is None:
+        return prior[gene]
+    return inheritance[genes.get(person["mother"], 0)][genes.get(person["father"], 0)][gene]
+
+
+def parents_first(people):
+    """
+    Return the names of `people` ordered so that everyone comes
+    after their parents.
+    """
+    order = []
+    placed = set()
+
+    def place(name):
+        if name is None or name in placed:
+            return
+        placed.add(name)
+        place(people[name]["mother"])
+        place(people[name]["father"])
+        order.append(name)
+
+    for name in people:
+        place(name)
+    return order
+
+
+def gene_assignments(people):
+    """
+    Lazily yield (genes, p) for every assignment of gene counts with
+    nonzero probability, where `genes` maps each name to a gene count
+    and `p` is the probability of those counts and the known traits.
+
+    People are assigned parents first, so `p` is built up one factor
+    per person along each branch and branches with zero probability
+    are cut off. The same `genes` dictionary is reused between yields.
+    """
+    order = parents_first(people)
+    genes = dict()
+
+    def extend(i, p):
+        if i == len(order):
+            yield genes, p
+            return
+        name = order[i]
+        for gene in GENES:
+            q = (p * gene_probability(people, name, gene, genes)
+                 * evidence_probability(people[name], gene))
+            if q == 0:
+                continue
+            genes[name] = gene
+            yield from extend(i + 1, q)
+        genes.pop(name, None)
+
+    return extend(0, 1)
+
+
+def pruned_probabilities(people):
+    """
+    Compute each person's gene and trait distributions by enumerating
+    gene assignments only, in the same format as `enumerate_probabilities`.
+
+    Known traits are fixed up front, and each unknown trait is summed
+    out analytically from the person's gene count instead of being
+    enumerated, which removes the 2^N factor of trait subsets.
+    """
+    probabilities = {
+        person: {
+            "gene": {
+                2: 0,
+                1: 0,
+                0: 0
+            },
+            "trait": {
+                True: 0,
+                False: 0
+            }
+        }
+        for person in people
+    }
+
+    for genes, p in gene_assignments(people):
+        for name, gene in genes.items():
+            probabilities[name]["gene"][gene] += p
+            trait = people[name]["trait"]
+            if trait is None:
+                probabilities[name]["trait"][True] += p * PROBS["trait"][gene][True]
+                probabilities[name]["trait"][False] += p * PROBS["trait"][gene][False]
+            else:
+                probabilities[name]["trait"][trait] += p
+
+    normalize(probabilities)
+    return probabilities
+
+
+def pedigree_factors(people, log=False):
+    """
+    Return one factor per person over the gene counts of the person and
+    their parents, as a (variables, table) pair where `table` maps each
+    tuple of gene counts to the probability of the person's gene count
+    given their parents', times the probability of any known trait.
+
+    If `log` is true, the tables hold log probabilities instead.
+    """
+    factors = []
+    for name, person in people.items():
+        parents = [p for p in (person["mother"], person["father"]) if p is not None]
+        variables = tuple(parents) + (name,)
+        table = dict()
+        for genes in itertools.product(GENES, repeat=len(variables)):
+            p = gene_probability(people, name, genes[-1], dict(zip(parents, genes)))
+            table[genes] = p * evidence_probability(person, genes[-1])
+            if log:
+                table[genes] = log_probability(table[genes])
+        factors.append((variables, table))
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Return an order in which to eliminate the variables of `factors`,
+    greedily picking the variable with the fewest neighbors each time.
+    """
+    neighbors = dict()
+    for variables, _ in factors:
+        for variable in variables:
+            neighbors.setdefault(variable, set()).update(variables)
+    for variable in neighbors:
+        neighbors[variable].discard(variable)
+
+    order = []
+    while neighbors:
+        variable = min(neighbors, key=lambda v: len(neighbors[v]))
+        adjacent = neighbors.pop(variable)
+        for other in adjacent:
+            neighbors[other].discard(variable)
+            neighbors[other].update(adjacent - {other})
+        order.append(variable)
+    return order
+
+
+def marginalize(factors, keep, log=False):
+    """
+    Multiply the factors together and sum every variable not in `keep`
+    out of the result, returning a factor over the variables of `keep`
+    that appear in `factors`.
+
+    If `log` is true, the factors hold log probabilities, so they are
+    added together and variables are summed out with `log_sum_exp`.
+    """
+    variables = []
+    for factor_variables, _ in factors:
+        for v in factor_variables:
+            if v not in variables:
+                variables.append(v)
+    kept = [v for v in variables if v in keep]
+    summed = [v for v in variables if v not in keep]
+    positions = {v: i for i, v in enumerate(kept + summed)}
+    lookups = [
+        ([positions[v] for v in factor_variables], table)
+        for factor_variables, table in factors
+    ]
+
+    table = dict()
+    for genes in itertools.product(GENES, repeat=len(kept)):
+        if log:
+            terms = []
+            for rest in itertools.product(GENES, repeat=len(summed)):
+                assignment = genes + rest
+                terms.append(sum(
+                    factor_table[tuple(assignment[i] for i in indexes)]
+                    for indexes, factor_table in lookups
+                ))
+            table[genes] = log_sum_exp(terms)
+            continue
+
+        total = 0
+        for rest in itertools.product(GENES, repeat=len(summed)):
+            assignment = genes + rest
+            p = 1
+            for indexes, factor_table in lookups:
+                p *= factor_table[tuple(assignment[i] for i in indexes)]
+            total += p
+        table[genes] = total
+    return tuple(kept), table
+
+
+def calibrate(factors, order, log=False):
+    """
+    Return a dictionary mapping each variable in `order` to its
+    unnormalized marginal, a factor over just that variable.
+
+    Each factor waits in the bucket of the first of its variables to be
+    eliminated. An upward pass eliminates the variables in `order`,
+    sending each bucket's message to the bucket of the first variable
+    left in it; a downward pass then sends each bucket the product of
+    everything else its receiving bucket holds, so every marginal is
+    read off its own bucket after two passes instead of one elimination
+    per variable. If `log` is true, the factors hold log probabilities.
+    """
+    position = {variable: i for i, variable in enumerate(order)}
+    buckets = [[] for _ in order]
+    for factor in factors:
+        buckets[min(position[v] for v in factor[0])].append(factor)
+
+    children = [[] for _ in order]
+    upward = [None for _ in order]
+    for i, variable in enumerate(order):
+        bucket = buckets[i] + [upward[child] for child in children[i]]
+        scope = {v for factor in bucket for v in factor[0]} - {variable}
+        upward[i] = marginalize(bucket, scope, log)
+        if scope:
+            children[min(position[v] for v in scope)].append(i)
+
+    downward = [None for _ in order]
+    marginals = dict()
+    for i in reversed(range(len(order))):
+        bucket = buckets[i] + [upward[child] for child in children[i]]
+        if downward[i] is not None:
+            bucket.append(downward[i])
+        marginals[order[i]] = marginalize(bucket, {order[i]}, log)
+        for child in children[i]:
+            others = [factor for factor in bucket if factor is not upward[child]]
+            downward[child] = marginalize(others, set(upward[child][0]), log)
+    return marginals
+
+
+def eliminate_variables(people, log=False):
+    """
+    Compute each person's gene and trait distributions exactly by
+    variable elimination over the pedigree's factors, calibrated once
+    for everyone by `calibrate`, in the same format as
+    `enumerate_probabilities`.
+
+    If `log` is true, elimination runs on log probabilities, so deep
+    pedigrees whose evidence probability underflows a float can still
+    be normalized. Raise ValueError if a person's mass is degenerate.
+    """
+    factors = pedigree_factors(people, log)
+    marginals = calibrate(factors, elimination_order(factors), log)
+    probabilities = dict()
+
+    for name in people:
+        _, table = marginals[name]
+        gene = {g: table[(g,)] for g in GENES}
+        if log:
+            total = log_sum_exp(list(gene.values()))
+            check_mass(name, total, log)
+            gene = {g: math.exp(gene[g] - total) for g in (2, 1, 0)}
+        else:
+            total = sum(gene.values())
+            check_mass(name, total)
+            gene = {g: gene[g] / total for g in (2, 1, 0)}
+
+        trait = people[name]["trait"]
+        if trait is None:
+            has_trait = sum(gene[g] * PROBS["trait"][g][True] for g in GENES)
+            trait_distribution = {True: has_trait, False: 1 - has_trait}
+        else:
+            trait_distribution = {True: float(trait), False: float(not trait)}
+        probabilities[name] = {"gene": gene, "trait": trait_distribution}
+    return probabilities
+
+
+def vectorized_probabilities(people, batch_size=BATCH_SIZE):
+    """
+    Compute each person's gene and trait distributions by enumerating
+    every gene assignment with NumPy, in the same format as
+    `enumerate_probabilities`.
+
+    Assignments are numbered 0 to 3^N - 1 and decoded in batches of
+    `batch_size` into an array of gene counts, one row per assignment.
+    Each row's probability is a product of gathers from the gene tables
+    and the evidence table, and unknown traits are summed out from the
+    gene marginals as in `pruned_probabilities`.
+    """
+    names = list(people)
+    column = {name: i for i, name in enumerate(names)}
+    prior, inheritance = gene_tables()
+    prior = np.array(prior)
+    inheritance = np.array(inheritance)
+    trait = np.array([[PROBS["trait"][g][True] for g in GENES]])
+
+    # A missing parent points at an extra column that always holds 0 copies
+    n = len(names)
+    mothers = np.array([column.get(people[name]["mother"], n) for name in names])
+    fathers = np.array([column.get(people[name]["father"], n) for name in names])
+    founders = np.array([
+        people[name]["mother"] is None and people[name]["father"] is None
+        for name in names
+    ])
+    evidence = np.array([
+        [evidence_probability(people[name], g) for g in GENES] for name in names
+    ])
+    people_index = np.arange(n)
+    powers = len(GENES) ** people_index
+
+    gene_mass = np.zeros((n, len(GENES)))
+    total = len(GENES) ** n
+    for start in range(0, total, batch_size):
+        codes = np.arange(start, min(start + batch_size, total))
+        genes = np.zeros((len(codes), n + 1), dtype=np.intp)
+        genes[:, :n] = codes[:, None] // powers % len(GENES)
+        own = genes[:, :n]
+
+        p = np.where(
+            founders,
+            prior[own],
+            inheritance[genes[:, mothers], genes[:, fathers], own]
+        )
+        p *= evidence[people_index, own]
+        joint = p.prod(axis=1)
+
+        np.add.at(
+            gene_mass,
+            (np.broadcast_to(people_index, own.shape), own),
+            np.broadcast_to(joint[:, None], own.shape)
+        )
+
+    has_trait = (gene_mass * trait).sum(axis=1)
+    mass = gene_mass.sum(axis=1)
+    probabilities = dict()
+    for i, name in enumerate(names):
+        known = people[name]["trait"]
+        if known is None:
+            trait_mass = {True: has_trait[i], False: mass[i] - has_trait[i]}
+        else:
+            trait_mass = {True: mass[i] * known, False: mass[i] * (not known)}
+        probabilities[name] = {
+            "gene": {g: float(gene_mass[i, g]) for g in (2, 1, 0)},
+            "trait": {t: float(trait_mass[t]) for t in (True, False)}
+        }
+
+    normalize(probabilities)
+    return probabilities
+
+
 if __name__ == "__main__":
     main()
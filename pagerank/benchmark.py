@@ -0,0 +1,120 @@
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from pagerank import (
+    DAMPING, ITERATIONS, SOLVERS, TOLERANCE, crawl, iterate_pagerank,
+    parallel_sample_pagerank, sample_pagerank, solve_pagerank,
+    sparse_pagerank, transition_matrix
+)
+from synthetic import KINDS, LINKS, generate_corpus, write_html
+
+SIZES = (1000, 10000)
+SOLVER_SIZES = (10000, 100000, 1000000)
+SAMPLES = 100000
+ENGINES = ("crawl", "sample", "parallel-sample", "iterate") + SOLVERS
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure PageRank engines on synthetic corpora."
+    )
+    parser.add_argument("--kinds", nargs="+", choices=KINDS)
+    parser.add_argument("--sizes", type=int, nargs="+")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES)
+    parser.add_argument("--solvers", action="store_true",
+                        help="compare only the sparse solvers, by default "
+                             "on random corpora of 10k to 1M pages")
+    parser.add_argument("--links", type=int, default=LINKS,
+                        help="mean number of links per page")
+    parser.add_argument("--samples", type=int, default=SAMPLES,
+                        help="samples drawn by the sampling engines")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.solvers:
+        args.kinds = args.kinds or ("random",)
+        args.sizes = args.sizes or SOLVER_SIZES
+        args.engines = args.engines or SOLVERS
+    args.kinds = args.kinds or KINDS
+    args.sizes = args.sizes or SIZES
+    args.engines = args.engines or ENGINES
+
+    print(f"{'kind':<10}{'pages':>9}  {'engine':<16}{'iterations':>10}"
+          f"{'seconds':>10}{'peak MiB':>10}{'L1 error':>12}")
+    for kind in args.kinds:
+        for size in args.sizes:
+            corpus = generate_corpus(kind, size, args.links, args.seed)
+            reference, _ = sparse_pagerank(corpus, DAMPING, tolerance=1e-14)
+            with tempfile.TemporaryDirectory() as directory:
+                if "crawl" in args.engines:
+                    write_html(corpus, directory)
+                for engine in args.engines:
+                    result = measure(engine, corpus, directory, args)
+                    print(f"{kind:<10}{size:>9}  {engine:<16}"
+                          f"{result['iterations'] or '':>10}"
+                          f"{result['seconds']:>10.3f}"
+                          f"{result['peak_memory'] / 2 ** 20:>10.1f}"
+                          f"{error(engine, result['output'], corpus, reference):>12.2e}")
+
+
+def measure(engine, corpus, directory, args):
+    """
+    Run `engine` twice, once timed and once under tracemalloc, and
+    return its output, iteration count, wall time and peak memory.
+    """
+    start = time.perf_counter()
+    output, iterations = run(engine, corpus, directory, args)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    run(engine, corpus, directory, args)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "output": output,
+        "iterations": iterations,
+        "seconds": seconds,
+        "peak_memory": peak_memory
+    }
+
+
+def run(engine, corpus, directory, args):
+    """
+    Run one engine on a corpus and return its output (a corpus for
+    "crawl", PageRank values otherwise) and iteration count, if any.
+    """
+    if engine == "crawl":
+        return crawl(directory), None
+    elif engine == "sample":
+        return sample_pagerank(corpus, DAMPING, args.samples, seed=args.seed), None
+    elif engine == "parallel-sample":
+        ranks, stats = parallel_sample_pagerank(
+            corpus, DAMPING, args.samples, seed=args.seed
+        )
+        return ranks, stats["rounds"]
+    elif engine == "iterate":
+        return iterate_pagerank(corpus, DAMPING), ITERATIONS
+
+    pages, indptr, indices, out_degree = transition_matrix(corpus)
+    rank, iterations = solve_pagerank(
+        indptr, indices, out_degree, DAMPING, args.tolerance, solver=engine
+    )
+    return dict(zip(pages, rank.tolist())), iterations
+
+
+def error(engine, output, corpus, reference):
+    """
+    Return the L1 distance between an engine's PageRank values and the
+    reference solution, or for "crawl" the number of pages whose links
+    differ from the generated corpus.
+    """
+    if engine == "crawl":
+        return sum(output.get(page) != links for page, links in corpus.items())
+    return sum(abs(output.get(page, 0) - rank) for page, rank in reference.items())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,29 @@
+import heapq
+import json
+import math
 import os
-import random
 import re
+import struct
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 DAMPING = 0.85
 SAMPLES = 10000
+ITERATIONS = 1000
+TOLERANCE = 1e-10
+WALKERS = 1024
+MIXING_ERROR = 1e-6
+ROUND_SAMPLES = 100000
+MIN_CHAINS = 8
+CHUNK_SIZE = 1 << 16
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+EDGES_MAGIC = b"PREDGES1"
+SOLVERS = ("jacobi", "gauss-seidel", "extrapolation", "adaptive")
+EXTRAPOLATION_PERIOD = 10
+DENSE_FRACTION = 8
 
 
 def main():
@@ -13,6 +32,10 @@ def main():
     corpus = crawl(sys.argv[1])
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
+    for page in sorted(ranks):
+        print(f"  {page}: {ranks[page]:.4f}")
+    ranks, iterations = sparse_pagerank(corpus, DAMPING)
+    print(f"PageRank Results from Sparse Iteration ({iterations} iterations)")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
     ranks = iterate_pagerank(corpus, DAMPING)
@@ -21,22 +44,87 @@ def main():
         print(f"  {page}: {ranks[page]:.4f}")
 
 
-def crawl(directory):
+class Corpus(dict):
+    """
+    Dictionary from each page to the frozenset of pages it links to,
+    which also caches its reverse index of incoming links and its
+    outgoing-link arrays. Links are stored frozen, so changing a page's
+    links means assigning it a new set, which drops the caches.
+    """
+
+    incoming = None
+    outgoing = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.update(*args, **kwargs)
+
+    def invalidate(self):
+        self.incoming = None
+        self.outgoing = None
+
+    def __setitem__(self, page, links):
+        super().__setitem__(page, frozenset(links))
+        self.invalidate()
+
+    def __delitem__(self, page):
+        super().__delitem__(page)
+        self.invalidate()
+
+    # dict's other mutating methods do not go through __setitem__ or
+    # __delitem__, so each of them has to freeze links and drop the cache
+    def update(self, *args, **kwargs):
+        for page, links in dict(*args, **kwargs).items():
+            super().__setitem__(page, frozenset(links))
+        self.invalidate()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, page, links=()):
+        if page not in self:
+            self[page] = links
+        return self[page]
+
+    def pop(self, page, *default):
+        self.invalidate()
+        return super().pop(page, *default)
+
+    def popitem(self):
+        self.invalidate()
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self.invalidate()
+
+
+def crawl(directory, workers=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    With more than one of `workers`, files are parsed concurrently
+    in a pool of processes.
     """
-    pages = dict()
+    pages = Corpus()
 
     # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+    filenames = [
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    ]
+    paths = [os.path.join(directory, filename) for filename in filenames]
+    if workers is not None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(paths) // (workers * 16))
+            found = list(executor.map(extract_links, paths, chunksize=chunksize))
+    else:
+        found = map(extract_links, paths)
+    for filename, links in zip(filenames, found):
+        pages[filename] = links - {filename}
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -48,6 +136,82 @@ def crawl(directory):
     return pages
 
 
+def extract_links(path):
+    """
+    Return the set of link targets in an HTML file, read in chunks
+    so the whole file is never held in memory at once.
+    """
+    links = set()
+    pending = ""
+    with open(path) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ""):
+            text = pending + chunk
+
+            # A tag may continue into the next chunk, so hold back
+            # everything from the last "<" until more text is read
+            cut = text.rfind("<")
+            if cut == -1:
+                cut = len(text)
+            links.update(LINK_PATTERN.findall(text, 0, cut))
+            pending = text[cut:]
+    links.update(LINK_PATTERN.findall(pending))
+    return links
+
+
+def save_edges(corpus, path):
+    """
+    Write the link graph of `corpus` to a binary edge list file:
+    a JSON header naming the pages, then (source, target) pairs of
+    page positions as 32-bit integers.
+    """
+    pages, indptr, indices = outgoing_matrix(corpus)
+    sources = np.repeat(np.arange(len(pages), dtype=np.int32), np.diff(indptr))
+    edges = np.column_stack((sources, indices.astype(np.int32)))
+    header = json.dumps({"pages": pages, "edges": len(edges)}).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(EDGES_MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        edges.astype("<i4").tofile(f)
+
+
+def load_edges(path):
+    """
+    Read a corpus written by `save_edges` without parsing any HTML.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(EDGES_MAGIC)) != EDGES_MAGIC:
+            raise ValueError(f"{path} is not an edge list file")
+        size, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(size))
+        edges = np.fromfile(f, dtype="<i4", count=2 * header["edges"])
+
+    pages = header["pages"]
+    links = [[] for _ in pages]
+    for source, target in edges.reshape(-1, 2).tolist():
+        links[source].append(pages[target])
+    return Corpus(zip(pages, links))
+
+
+def incoming_links(corpus):
+    """
+    Return a dictionary mapping each page to the list of pages that
+    link to it, built in a single pass over the links of `corpus`.
+    The index is cached on a `Corpus` until its links change.
+    """
+    if getattr(corpus, "incoming", None) is not None:
+        return corpus.incoming
+
+    incoming = {page: [] for page in corpus}
+    for page, links in corpus.items():
+        for link in links:
+            incoming[link].append(page)
+
+    if isinstance(corpus, Corpus):
+        corpus.incoming = incoming
+    return incoming
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -73,7 +237,7 @@ def transition_model(corpus, page, damping_factor):
     return model
 
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, seed=None, walkers=WALKERS):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
@@ -81,33 +245,281 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    The samples are drawn by up to `walkers` independent random surfers
+    moving together as NumPy arrays, each from its own random start page,
+    using random generator `seed`.
     """
-    main = list(corpus.keys())
-    sample_corpus = transition_model(corpus, random.choice(main), DAMPING)
-    sample = list(sample_corpus.keys())
-    sample_weights = list(sample_corpus.values())
-    corpus_list = []
-    
-    for _ in range(10000):
-        draw = random.choices(sample, sample_weights, k=1)
-        corpus_list.append(draw[0])
-        sample_corpus = transition_model(corpus, draw[0], DAMPING)
-        sample = list(sample_corpus.keys())
-        sample_weights = list(sample_corpus.values())
-        
-    pagerank = dict()
-    
-    for ele in corpus_list:
-        if ele in pagerank.keys():
-            pagerank[ele] += 1
+    pages, indptr, indices = outgoing_matrix(corpus)
+    counts, _ = _walk(indptr, indices, damping_factor, n,
+                      np.random.default_rng(seed), walkers)
+    return dict(zip(pages, (counts / n).tolist()))
+
+
+def parallel_sample_pagerank(corpus, damping_factor, n, chains=None,
+                             seed=None, tolerance=None, confidence=0.95,
+                             round_samples=ROUND_SAMPLES):
+    """
+    Return PageRank values for each page by sampling up to `n` pages
+    with independent surfer chains run across a pool of processes of
+    at most one per CPU. Unless `chains` is given, there is one chain
+    per CPU, but never fewer than `MIN_CHAINS`.
+
+    Chains draw `round_samples` samples at a time from their own random
+    streams derived from `seed`, and each chain's surfers carry on from
+    where its last round left them, so they only mix once. After each
+    round the chains' visit counts are merged, and if `tolerance` is
+    given, sampling stops early once the `confidence` interval of every
+    page's estimate is within `tolerance`.
+    The intervals use Student's t distribution, as each page's variance
+    is estimated from only as many values as there are chains.
+
+    Return a tuple of the dictionary of PageRank values and a dictionary
+    of diagnostics: samples drawn, chains, rounds, the variance of each
+    page's estimate, and the widest confidence interval half-width.
+    """
+    pages, indptr, indices = outgoing_matrix(corpus)
+    cpus = os.cpu_count() or 1
+    chains = max(2, chains) if chains else max(MIN_CHAINS, cpus)
+    entropy = np.random.SeedSequence(seed).entropy
+    per_round = max(1, round_samples // chains)
+
+    counts = np.zeros((chains, len(pages)), dtype=np.int64)
+    drawn = np.zeros(chains, dtype=np.int64)
+    positions = [None] * chains
+    rounds = 0
+    variance, half_width = _chain_spread(counts, drawn, confidence)
+    with ProcessPoolExecutor(
+        max_workers=min(chains, cpus), initializer=_init_chain,
+        initargs=(indptr, indices, damping_factor)
+    ) as executor:
+        while drawn.sum() < n:
+            remaining = n - drawn.sum()
+            sizes = [min(per_round, remaining // chains + (c < remaining % chains))
+                     for c in range(chains)]
+            jobs = [
+                np.random.SeedSequence(entropy, spawn_key=(chain, rounds))
+                for chain in range(chains)
+            ]
+            for chain, (chain_counts, current) in enumerate(
+                    executor.map(_run_chain, sizes, jobs, positions)):
+                counts[chain] += chain_counts
+                drawn[chain] += sizes[chain]
+                positions[chain] = current
+            rounds += 1
+
+            variance, half_width = _chain_spread(counts, drawn, confidence)
+            if tolerance is not None and half_width <= tolerance:
+                break
+
+    ranks = counts.sum(axis=0) / max(1, drawn.sum())
+    return dict(zip(pages, ranks.tolist())), {
+        "samples": int(drawn.sum()),
+        "chains": chains,
+        "rounds": rounds,
+        "variance": dict(zip(pages, variance.tolist())),
+        "half_width": half_width
+    }
+
+
+# Link structure shared by the chains run in each worker process
+_chain_links = None
+
+
+def _init_chain(indptr, indices, damping_factor):
+    global _chain_links
+    _chain_links = (indptr, indices, damping_factor)
+
+
+def _run_chain(samples, seed_sequence, current):
+    """
+    Return the visit counts of `samples` samples drawn by one chain and
+    the pages its surfers end on, given the pages they were left on by
+    the chain's last round, or None for a new chain.
+    """
+    indptr, indices, damping_factor = _chain_links
+    if samples == 0:
+        return np.zeros(len(indptr) - 1, dtype=np.int64), current
+    return _walk(indptr, indices, damping_factor, samples,
+                 np.random.default_rng(seed_sequence), WALKERS, current)
+
+
+def _chain_spread(counts, drawn, confidence):
+    """
+    Return the variance of each page's merged estimate, computed from the
+    spread between chains, and the widest `confidence` interval half-width.
+    """
+    active = int((drawn > 0).sum())
+    if active < 2:
+        variance = np.full(counts.shape[1], np.inf)
+        return variance, np.inf
+    estimates = counts[drawn > 0] / drawn[drawn > 0, None]
+    variance = estimates.var(axis=0, ddof=1) / active
+    t = _t_quantile((1 + confidence) / 2, active - 1)
+    return variance, float(t * np.sqrt(variance.max()))
+
+
+def _t_quantile(probability, dof):
+    """
+    Return the `probability` quantile, for `probability` above 0.5, of
+    Student's t distribution with a whole number `dof` of degrees of
+    freedom, by bisection on its closed-form distribution function.
+    """
+    def central(x):
+        # Probability that |T| < x (Abramowitz and Stegun 26.7.3-4)
+        theta = math.atan(x / math.sqrt(dof))
+        c2 = math.cos(theta) ** 2
+        if dof % 2 == 0:
+            term = total = 1
+            for k in range(1, dof // 2):
+                term *= c2 * (2 * k - 1) / (2 * k)
+                total += term
+            return math.sin(theta) * total
+        if dof == 1:
+            return 2 * theta / math.pi
+        term = total = 1
+        for k in range(1, (dof - 1) // 2):
+            term *= c2 * (2 * k) / (2 * k + 1)
+            total += term
+        return 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * total)
+
+    target = 2 * probability - 1
+    low, high = 0, 1
+    while central(high) < target:
+        low, high = high, 2 * high
+    for _ in range(100):
+        middle = (low + high) / 2
+        if central(middle) < target:
+            low = middle
         else:
-            pagerank[ele] = 1
-            
-    for ele in pagerank.keys():
-        pagerank[ele] = pagerank[ele]/n
-    
-    return pagerank
-        
+            high = middle
+    return high
+
+
+def outgoing_matrix(corpus):
+    """
+    Build the link structure of `corpus` as a CSR matrix of outgoing links.
+
+    Return a tuple (pages, indptr, indices) where the pages linked to by
+    `pages[i]` are at positions `indices[indptr[i]:indptr[i + 1]]`.
+    """
+    pages, _, indptr, indices = _outgoing_links(corpus)
+    return pages, indptr, indices
+
+
+def _outgoing_links(corpus):
+    """
+    Return the tuple (pages, index, indptr, indices) behind
+    `outgoing_matrix`, where `index` maps each page to its position.
+    The arrays are cached on a `Corpus` until its links change.
+    """
+    if getattr(corpus, "outgoing", None) is not None:
+        return corpus.outgoing
+
+    pages = list(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    n = len(pages)
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(
+        np.fromiter((len(corpus[page]) for page in pages), dtype=np.int64, count=n),
+        out=indptr[1:]
+    )
+    indices = np.fromiter(
+        (index[link] for page in pages for link in corpus[page]),
+        dtype=np.int64, count=int(indptr[-1])
+    )
+
+    if isinstance(corpus, Corpus):
+        corpus.outgoing = (pages, index, indptr, indices)
+    return pages, index, indptr, indices
+
+
+def _patch_outgoing(corpus, outgoing, changed):
+    """
+    Return the outgoing-link arrays of `corpus` after the links of the
+    pages in `changed` have changed and any new pages have been added,
+    given `outgoing`, the arrays from before the change. Only the rows
+    of changed pages are rebuilt from `corpus`.
+    """
+    pages, index, indptr, indices = outgoing
+    if len(corpus) > len(pages):
+        pages = pages + [page for page in corpus if page not in index]
+        index = dict(index)
+        for page in pages[len(index):]:
+            index[page] = len(index)
+    n = len(pages)
+
+    old_degree = np.diff(indptr)
+    degree = np.zeros(n, dtype=np.int64)
+    degree[:len(old_degree)] = old_degree
+    kept = np.ones(n, dtype=bool)
+    for page in changed:
+        kept[index[page]] = False
+        degree[index[page]] = len(corpus[page])
+
+    new_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(degree, out=new_indptr[1:])
+    new_indices = np.empty(int(new_indptr[-1]), dtype=np.int64)
+    new_indices[np.repeat(kept, degree)] = indices[
+        np.repeat(kept[:len(old_degree)], old_degree)
+    ]
+    for page in changed:
+        i = index[page]
+        new_indices[new_indptr[i]:new_indptr[i + 1]] = [
+            index[link] for link in corpus[page]
+        ]
+    return pages, index, new_indptr, new_indices
+
+
+def _walk(indptr, indices, damping_factor, n, rng, walkers, current=None):
+    """
+    Return how many of `n` samples landed on each page, drawn by
+    random surfers that each start on a uniformly random page, and the
+    pages the surfers end on.
+
+    Surfers first take enough unrecorded steps for their distribution to
+    be within `MIXING_ERROR` of the stationary one, since every step
+    contracts the distance to it by at least `damping_factor`. Surfers
+    already mixed can continue from their pages in `current` instead.
+    """
+    pages = len(indptr) - 1
+    out_degree = np.diff(indptr)
+    counts = np.zeros(pages, dtype=np.int64)
+
+    if current is None:
+        current = rng.integers(pages, size=max(1, min(walkers, n)))
+        burn_in = 0
+        if 0 < damping_factor < 1:
+            burn_in = int(np.ceil(np.log(MIXING_ERROR) / np.log(damping_factor)))
+        for _ in range(burn_in):
+            current = _step_walkers(current, indptr, indices, out_degree,
+                                    damping_factor, rng)
+
+    remaining = n
+    while remaining > 0:
+        current = _step_walkers(current, indptr, indices, out_degree,
+                                damping_factor, rng)
+        taken = min(len(current), remaining)
+        counts += np.bincount(current[:taken], minlength=pages)
+        remaining -= taken
+    return counts, current
+
+
+def _step_walkers(current, indptr, indices, out_degree, damping_factor, rng):
+    """
+    Return the next page of each surfer at a page in `current`.
+    """
+    # Follow a random link with probability `damping_factor` when there
+    # is one, otherwise jump to a page chosen uniformly at random
+    degree = out_degree[current]
+    follow = (rng.random(len(current)) < damping_factor) & (degree > 0)
+    following = current[follow]
+    offsets = (rng.random(len(following)) * degree[follow]).astype(np.int64)
+    current = rng.integers(len(out_degree), size=len(current))
+    current[follow] = indices[indptr[following] + offsets]
+    return current
+
 
 def iterate_pagerank(corpus, damping_factor):
     """
@@ -119,34 +531,452 @@ def iterate_pagerank(corpus, damping_factor):
     PageRank values should sum to 1.
     """
     pagerank = dict()
-    fixed = (1 - damping_factor)/len(corpus)   
-    
+    fixed = (1 - damping_factor)/len(corpus)
+
     """
     assign pagerank of 1/N to each page in corpus
     """
     for key in corpus.keys():
         pagerank[key] = 1/len(corpus)
-            
-    for i, j in corpus.items():
-        if len(j) == 0:
-            for a in corpus.keys():
-                corpus[i].add(a)      
-       
-    for _ in range(1000):
+
+    # A page with no links counts as linking to every page, itself
+    # included, so its rank is spread evenly as one shared term
+    dangling = {page for page, links in corpus.items() if len(links) == 0}
+    dangling_mass = sum(pagerank[page] for page in dangling)
+
+    incoming = incoming_links(corpus)
+    for _ in range(ITERATIONS):
         for ele in corpus.keys():
             #  calculate summation term
-            summation = 0
-            for i in Numlinks(corpus, ele):
+            summation = dangling_mass/len(corpus)
+            for i in incoming[ele]:
                 summation += pagerank[i]/len(corpus[i])
-            pagerank[ele] = fixed + damping_factor * summation    
-            
-    return pagerank   
-            
-        
+            rank = fixed + damping_factor * summation
+            if ele in dangling:
+                dangling_mass += rank - pagerank[ele]
+            pagerank[ele] = rank
+
+    return pagerank
+
+
+def transition_matrix(corpus):
+    """
+    Build the link structure of `corpus` as a CSR matrix of incoming links.
+
+    Return a tuple (pages, indptr, indices, out_degree) where `pages` is
+    a list of page names and the rest are NumPy arrays: the pages that
+    link to `pages[i]` are at positions `indices[indptr[i]:indptr[i + 1]]`,
+    and `out_degree[j]` is the number of links on `pages[j]`.
+    """
+    pages = list(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    incoming = incoming_links(corpus)
+    n = len(pages)
+
+    out_degree = np.fromiter(
+        (len(corpus[page]) for page in pages), dtype=np.int64, count=n
+    )
+    in_degree = np.fromiter(
+        (len(incoming[page]) for page in pages), dtype=np.int64, count=n
+    )
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(in_degree, out=indptr[1:])
+    indices = np.fromiter(
+        (index[link] for page in pages for link in incoming[page]),
+        dtype=np.int64, count=int(indptr[-1])
+    )
+    return pages, indptr, indices, out_degree
+
+
+def sparse_pagerank(corpus, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=1000, initial=None, solver="jacobi"):
+    """
+    Return PageRank values for each page by power iteration over a
+    sparse transition matrix, stopping once the L1 change between two
+    iterations falls below `tolerance`.
+
+    Pages with no links are treated as linking to every page, without
+    materializing those links. Iteration starts from 1/N for every page,
+    or from the PageRank values in `initial` if given. `solver` is one
+    of `SOLVERS`; see `solve_pagerank`. Return a tuple of a dictionary
+    of PageRank values, as `iterate_pagerank` does, and the number of
+    iterations run.
+    """
+    pages, indptr, indices, out_degree = transition_matrix(corpus)
+    rank, iterations = solve_pagerank(
+        indptr, indices, out_degree, damping_factor, tolerance,
+        max_iterations, _initial_rank(pages, initial), solver
+    )
+    return dict(zip(pages, rank.tolist())), iterations
+
+
+def solve_pagerank(indptr, indices, out_degree, damping_factor,
+                   tolerance=TOLERANCE, max_iterations=1000, rank=None,
+                   solver="jacobi"):
+    """
+    Return the PageRank vector for a `transition_matrix` and the number
+    of iterations taken, starting from `rank` (default 1/N everywhere).
+
+    Solvers:
+        * "jacobi": plain power iteration.
+        * "gauss-seidel": sweeps that use each page's new value as soon
+          as it is computed, rescaled to sum to 1 after each sweep.
+        * "extrapolation": power iteration with quadratic extrapolation
+          (Kamvar et al.) every `EXTRAPOLATION_PERIOD` iterations.
+        * "adaptive": power iteration that, once the total change is
+          below the square root of `tolerance`, stops recomputing pages
+          whose value changed by less than `tolerance / N` in each of
+          the last two iterations.
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver: {solver}")
+    n = len(out_degree)
+    if rank is None:
+        rank = np.full(n, 1 / n)
+    dangling = out_degree == 0
+    inverse_degree = np.divide(
+        1.0, out_degree, out=np.zeros(n), where=~dangling
+    )
+    solve = {
+        "jacobi": _jacobi,
+        "gauss-seidel": _gauss_seidel,
+        "extrapolation": _extrapolation,
+        "adaptive": _adaptive
+    }[solver]
+    rank, iterations = solve(rank, indptr, indices, inverse_degree, dangling,
+                             damping_factor, tolerance, max_iterations)
+    return rank / rank.sum(), iterations
+
+
+def _jacobi(rank, indptr, indices, inverse_degree, dangling, damping_factor,
+            tolerance, max_iterations):
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        new_rank = _step(rank, indptr, indices, inverse_degree, dangling,
+                         damping_factor)
+        change = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if change < tolerance:
+            break
+    return rank, iterations
+
+
+def _gauss_seidel(rank, indptr, indices, inverse_degree, dangling,
+                  damping_factor, tolerance, max_iterations):
+    n = len(rank)
+    base = (1 - damping_factor) / n
+    rank = rank.tolist()
+    starts = indptr.tolist()
+    indices = indices.tolist()
+    inverse_degree = inverse_degree.tolist()
+    dangling = dangling.tolist()
+
+    # Each page's share of rank passed along every one of its links, and
+    # the total rank on pages with no links, kept current as pages update
+    shares = [r * w for r, w in zip(rank, inverse_degree)]
+    dangling_mass = sum(r for r, d in zip(rank, dangling) if d)
+
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        change = 0
+        for i in range(n):
+            incoming = sum(map(shares.__getitem__,
+                               indices[starts[i]:starts[i + 1]]))
+            new = base + damping_factor * (incoming + dangling_mass / n)
+            change += abs(new - rank[i])
+            if dangling[i]:
+                dangling_mass += new - rank[i]
+            rank[i] = new
+            shares[i] = new * inverse_degree[i]
+        if change < tolerance:
+            break
+
+        # The solution sums to 1, so rescaling to that removes the error
+        # in total rank, which sweeps alone only shrink by `damping_factor`
+        total = sum(rank)
+        rank = [r / total for r in rank]
+        shares = [s / total for s in shares]
+        dangling_mass /= total
+    return np.array(rank), iterations
+
+
+def _extrapolation(rank, indptr, indices, inverse_degree, dangling,
+                   damping_factor, tolerance, max_iterations):
+    history = []
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        new_rank = _step(rank, indptr, indices, inverse_degree, dangling,
+                         damping_factor)
+        change = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if change < tolerance:
+            break
+
+        history = (history + [rank])[-4:]
+        if len(history) == 4 and iterations % EXTRAPOLATION_PERIOD == 0:
+            rank = _quadratic_extrapolation(*history)
+            history = []
+    return rank, iterations
+
+
+def _quadratic_extrapolation(first, second, third, fourth):
+    """
+    Return the quadratic extrapolation of four successive iterates,
+    which removes their components along the next two eigenvectors,
+    or `fourth` unchanged if the result is not a valid distribution.
+    """
+    differences = np.column_stack((second - first, third - first))
+    (g1, g2), *_ = np.linalg.lstsq(differences, first - fourth, rcond=None)
+    extrapolated = (g1 + g2 + 1) * second + (g2 + 1) * third + fourth
+    if not np.isfinite(extrapolated).all() or (extrapolated <= 0).any():
+        return fourth
+    return extrapolated / extrapolated.sum()
+
+
+def _adaptive(rank, indptr, indices, inverse_degree, dangling,
+              damping_factor, tolerance, max_iterations):
+    n = len(rank)
+    threshold = tolerance / n
+    rank = rank.copy()
+    active = np.arange(n)
+    active_indptr, active_indices = indptr, indices
+    settled = np.zeros(n, dtype=bool)
+
+    iterations = 0
+    while iterations < max_iterations and len(active):
+        iterations += 1
+        contributions = (rank * inverse_degree)[active_indices]
+        incoming = _row_sums(contributions, active_indptr)
+        dangling_mass = rank[dangling].sum()
+        new = (1 - damping_factor) / n + damping_factor * (incoming + dangling_mass / n)
+        delta = np.abs(new - rank[active])
+        rank[active] = new
+        if delta.sum() < tolerance:
+            break
+
+        # Freeze pages that have settled twice in a row and drop their rows
+        if delta.sum() >= tolerance ** 0.5:
+            continue
+        small = delta < threshold
+        moving = ~(small & settled)
+        settled = small[moving]
+        if not moving.all():
+            active = active[moving]
+            active_indptr, active_indices = _select_rows(indptr, indices, active)
+    return rank, iterations
+
+
+def _select_rows(indptr, indices, rows):
+    """
+    Return the CSR (indptr, indices) of just the given rows.
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    selected = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=selected[1:])
+    positions = (np.repeat(starts - selected[:-1], lengths)
+                 + np.arange(selected[-1]))
+    return selected, indices[positions]
+
+
+def update_pagerank(corpus, ranks, added=(), removed=(),
+                    damping_factor=DAMPING, tolerance=TOLERANCE):
+    """
+    Apply link changes to `corpus` in place and return its updated
+    PageRank values, given `ranks`, the values computed before the change.
+
+    `added` and `removed` are iterables of (page, link) pairs; pages
+    that appear in `added` but not in the corpus are added to it.
+    Return a tuple of the dictionary of PageRank values and the
+    number of push rounds run.
+
+    The old values still solve the old corpus's equations except where
+    links changed, so the residual they leave starts out only on the
+    targets of changed links and on new pages. Each round pushes the
+    residual of every page where it is at least `tolerance` / N along
+    that page's links, touching only the pages the push has reached.
+    Once a round covers more than 1 / `DENSE_FRACTION` of the corpus, as
+    it soon does on a well-linked corpus at a tight `tolerance`, rounds
+    run over every page like a warm-started power iteration. The
+    outgoing-link arrays of a `Corpus` are patched for the changed
+    pages rather than rebuilt.
+    """
+    added, removed = list(added), list(removed)
+    outgoing = _outgoing_links(corpus)
+    changed = dict()
+    for page, _ in added + removed:
+        if page not in changed:
+            changed[page] = len(corpus.get(page, ()))
+
+    for page, link in added:
+        for new_page in (page, link):
+            if new_page not in corpus:
+                corpus[new_page] = set()
+        if page != link:
+            corpus[page] = corpus[page] | {link}
+    for page, link in removed:
+        corpus[page] = corpus[page] - {link}
+
+    old_pages, _, old_indptr, old_indices = outgoing
+    pages, index, indptr, indices = _patch_outgoing(corpus, outgoing, changed)
+    if isinstance(corpus, Corpus):
+        corpus.outgoing = (pages, index, indptr, indices)
+    old_n, n = len(old_pages), len(pages)
+
+    values = np.zeros(n)
+    values[:old_n] = np.fromiter(
+        (ranks[page] for page in old_pages), dtype=np.float64, count=old_n
+    )
+    degree = np.diff(indptr)
+    old_degree = np.diff(old_indptr)
+
+    # The teleport and dangling mass add the same share to every page,
+    # and changing that share only rescales the solution, so it is held
+    # at its old value and the result normalized at the end. The old
+    # values then leave a residual only where links changed and on new
+    # pages, which start at 0
+    share = ((1 - damping_factor)
+             + damping_factor * values[:old_n][old_degree == 0].sum()) / old_n
+    residual = np.zeros(n)
+    residual[old_n:] = share
+    touched = [np.arange(old_n, n)]
+
+    # Links that moved carry their page's damped value elsewhere
+    for page, old_count in changed.items():
+        i = index[page]
+        mass = damping_factor * values[i]
+        if old_count:
+            targets = old_indices[old_indptr[i]:old_indptr[i + 1]]
+            residual[targets] -= mass / old_count
+            touched.append(targets)
+        if degree[i]:
+            targets = indices[indptr[i]:indptr[i + 1]]
+            residual[targets] += mass / degree[i]
+            touched.append(targets)
+
+    threshold = tolerance / n
+    frontier = np.unique(np.concatenate(touched))
+    rounds = 0
+    while True:
+        if frontier is None:
+            # Cancel the residual mass by rescaling, which turns it into
+            # a change of the fixed share; pushing would only shrink it
+            # by `damping_factor` a round
+            offset = residual.sum() / n
+            scale = share / (share - offset)
+            values *= scale
+            residual = scale * (residual - offset)
+            active = np.flatnonzero(np.abs(residual) >= threshold)
+        else:
+            active = frontier[np.abs(residual[frontier]) >= threshold]
+        if len(active) == 0:
+            break
+        rounds += 1
+        mass = residual[active]
+        values[active] += mass
+        residual[active] = 0
+
+        # Pages with no links pass nothing on; their share of the
+        # dangling mass is part of the share held fixed above
+        linked = degree[active] > 0
+        counts = degree[active[linked]]
+        _, targets = _select_rows(indptr, indices, active[linked])
+        weights = np.repeat(damping_factor * mass[linked] / counts, counts)
+
+        # Once the change has reached much of the corpus, rounds run
+        # over every page instead of tracking which ones were reached
+        if frontier is None or len(active) > n // DENSE_FRACTION:
+            frontier = None
+            residual += np.bincount(targets, weights, minlength=n)
+        else:
+            frontier, positions = np.unique(targets, return_inverse=True)
+            residual[frontier] += np.bincount(positions, weights)
+
+    values /= values.sum()
+    return dict(zip(pages, values.tolist())), rounds
+
+
+def personalized_pagerank(corpus, seeds, damping_factor=DAMPING,
+                          tolerance=1e-6, k=10):
+    """
+    Return the `k` pages with the highest PageRank personalized to the
+    pages in `seeds`, as a list of (page, value) pairs, highest first.
+
+    Uses forward push: rank starts as residual mass on the seeds and is
+    pushed along links until every page's residual is below `tolerance`
+    times its number of links. Only pages reached by the push are
+    touched, so the cost depends on `tolerance` but not on corpus size.
+    Surfers on pages with no links jump back to the seeds.
+    """
+    seeds = list(dict.fromkeys(seeds))
+    estimate = dict()
+    residual = {seed: 1 / len(seeds) for seed in seeds}
+    queue = deque(seeds)
+    queued = set(seeds)
+
+    while queue:
+        page = queue.popleft()
+        queued.discard(page)
+        links = corpus[page]
+        mass = residual[page]
+        if mass < tolerance * max(len(links), 1):
+            continue
+
+        # Keep the teleport share here and pass the rest along the links
+        residual[page] = 0
+        estimate[page] = estimate.get(page, 0) + (1 - damping_factor) * mass
+        targets = links if links else seeds
+        share = damping_factor * mass / len(targets)
+        for link in targets:
+            residual[link] = residual.get(link, 0) + share
+            if (link not in queued
+                    and residual[link] >= tolerance * max(len(corpus[link]), 1)):
+                queue.append(link)
+                queued.add(link)
+
+    return heapq.nlargest(k, estimate.items(), key=lambda item: item[1])
+
+
+def _initial_rank(pages, initial):
+    """
+    Return the starting PageRank vector: 1/N for every page, or the
+    values in `initial` with 1/N for pages missing from it, rescaled
+    to sum to 1.
+    """
+    n = len(pages)
+    if initial is None:
+        return np.full(n, 1 / n)
+    rank = np.fromiter(
+        (initial.get(page, 1 / n) for page in pages), dtype=np.float64, count=n
+    )
+    return rank / rank.sum()
+
+
+def _step(rank, indptr, indices, inverse_degree, dangling, damping_factor):
+    """
+    Return the PageRank vector after one power iteration from `rank`.
+    """
+    n = len(rank)
+    incoming = _row_sums((rank * inverse_degree)[indices], indptr)
+    dangling_mass = rank[dangling].sum()
+    return (1 - damping_factor) / n + damping_factor * (incoming + dangling_mass / n)
+
+
+def _row_sums(values, indptr):
+    """
+    Return the sum of `values` within each CSR row, as differences
+    of a running total.
+    """
+    totals = np.zeros(len(values) + 1)
+    np.cumsum(values, out=totals[1:])
+    return totals[indptr[1:]] - totals[indptr[:-1]]
+
+
 def Numlinks(corpus, page):
-    numlink = [key for key, val in corpus.items() if page in val]
-   
-    return numlink     
+    return incoming_links(corpus)[page]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+import argparse
+import os
+import random
+
+from pagerank import Corpus, save_edges
+
+KINDS = ("random", "power-law", "chain", "dangling")
+LINKS = 8
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic corpus as HTML pages or an edge list."
+    )
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("pages", type=int)
+    parser.add_argument("output",
+                        help="directory for HTML pages, or file for an edge list")
+    parser.add_argument("--links", type=int, default=LINKS,
+                        help="mean number of links per page")
+    parser.add_argument("--format", choices=("html", "edges"), default="html")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.kind, args.pages, args.links, args.seed)
+    if args.format == "html":
+        write_html(corpus, args.output)
+    else:
+        save_edges(corpus, args.output)
+
+
+def generate_corpus(kind, pages, links=LINKS, seed=None):
+    """
+    Return a synthetic corpus of `pages` pages named "0.html", "1.html", ...
+
+    Kinds:
+        * "random": each page links to up to 2 * `links` pages chosen
+          uniformly at random.
+        * "power-law": pages pick link targets in proportion to the
+          links they already have, so a few pages gather most links.
+        * "chain": each page links only to the next one; the last
+          page has no links.
+        * "dangling": like "random", but half the pages have no links.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown corpus kind: {kind}")
+    rng = random.Random(seed)
+    names = [f"{i}.html" for i in range(pages)]
+    corpus = Corpus()
+
+    if kind == "chain":
+        for i, name in enumerate(names):
+            corpus[name] = {names[i + 1]} if i + 1 < pages else set()
+        return corpus
+
+    # Every link added so far, so that drawing from it favours popular pages
+    targets = []
+    for name in names:
+        count = rng.randint(0, 2 * links)
+        if kind == "dangling" and rng.random() < 0.5:
+            count = 0
+        chosen = set()
+        for _ in range(count):
+            if kind == "power-law" and targets and rng.random() < 0.9:
+                chosen.add(rng.choice(targets))
+            else:
+                chosen.add(names[rng.randrange(pages)])
+        chosen.discard(name)
+        targets.extend(chosen)
+        corpus[name] = chosen
+    return corpus
+
+
+def write_html(corpus, directory):
+    """
+    Write each page of `corpus` to `directory` as an HTML file
+    containing a link to every page it links to.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for page, links in corpus.items():
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<head>\n<title>{page}</title>\n</head>\n<body>\n")
+            for link in sorted(links):
+                f.write(f"<a href=\"{link}\">{link}</a>\n")
+            f.write("</body>\n</html>\n")
+
+
+if __name__ == "__main__":
+    main()